@@ -1,92 +1,121 @@
-import json
+import orjson
 import os
-from typing import Optional
+from file_utils import LogStore
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Mapping, Optional
 
 # 강의실 데이터 저장소
 # 구조: {classroom_id: {"name": str, "location": str, "capacity": int, "equipment": dict}}
+# 변경 내역은 CLASSROOMS_LOG_FILE에 한 줄씩 추가되고, compact() 시 스냅샷(CLASSROOMS_FILE)으로 합쳐짐
 CLASSROOMS_FILE = "classrooms.json"
+CLASSROOMS_LOG_FILE = "classrooms.jsonl"
 CLASSROOMS: dict[int, dict] = {}
 _next_id = 1
+_CLASSROOMS_VERSION = 0  # CLASSROOMS가 바뀔 때마다 증가 (get_all_classrooms 캐시 무효화용)
 
-def _load_classrooms() -> tuple[dict[int, dict], int]:
-    """파일에서 강의실 데이터 로드"""
+def _load_classrooms() -> int:
+    """파일에서 강의실 데이터를 CLASSROOMS에 바로 로드하고 next_id를 반환"""
     if os.path.exists(CLASSROOMS_FILE):
         try:
-            with open(CLASSROOMS_FILE, "r", encoding="utf-8") as f:
-                data = json.load(f)
-                # JSON에서는 키가 문자열이므로 정수로 변환
-                classrooms = {int(k): v for k, v in data.get("classrooms", {}).items()}
-                next_id = data.get("next_id", 1)
-                return classrooms, next_id
-        except (json.JSONDecodeError, IOError, ValueError, KeyError):
-            return {}, 1
-    return {}, 1
+            with open(CLASSROOMS_FILE, "rb") as f:
+                data = orjson.loads(f.read())
+            # JSON에서는 키가 문자열이므로 정수로 변환 (중간 dict 없이 바로 저장소에 넣음)
+            for k, v in data.get("classrooms", {}).items():
+                CLASSROOMS[int(k)] = v
+            return data.get("next_id", 1)
+        except (orjson.JSONDecodeError, IOError, ValueError, KeyError):
+            CLASSROOMS.clear()
+            return 1
+    return 1
 
-def _save_classrooms() -> None:
-    """강의실 데이터를 파일에 저장"""
-    try:
-        # JSON에서는 키가 문자열이므로 변환
-        data = {
-            "classrooms": {str(k): v for k, v in CLASSROOMS.items()},
-            "next_id": _next_id
-        }
-        with open(CLASSROOMS_FILE, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
-    except IOError:
-        pass  # 파일 저장 실패 시 무시 (로깅 가능)
+def _snapshot_bytes() -> bytes:
+    """현재 강의실 데이터를 스냅샷 파일 내용으로 직렬화"""
+    # 정수 키는 OPT_NON_STR_KEYS로 문자열 키로 저장됨
+    data = {
+        "classrooms": CLASSROOMS,
+        "next_id": _next_id
+    }
+    return orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+
+def _apply(record: dict) -> None:
+    """로그 한 줄의 변경 내역을 CLASSROOMS에 반영"""
+    global _next_id
+    classroom_id = record.get("id")
+    if record.get("op") == "put":
+        CLASSROOMS[classroom_id] = record["data"]
+        _next_id = max(_next_id, classroom_id + 1)
+    elif record.get("op") == "delete":
+        CLASSROOMS.pop(classroom_id, None)
 
-# 서버 시작 시 데이터 로드
-loaded_classrooms, loaded_next_id = _load_classrooms()
-CLASSROOMS.update(loaded_classrooms)
-_next_id = loaded_next_id
+_STORE = LogStore(CLASSROOMS_FILE, CLASSROOMS_LOG_FILE, _snapshot_bytes, _apply)
+compact = _STORE.compact
+compact_async = _STORE.compact_async
+
+# 서버 시작 시 데이터 로드: 스냅샷을 읽은 뒤 옮겨 둔 로그와 현재 로그를 차례로 반영
+_next_id = _load_classrooms()
+_STORE.replay()
 
 def create_classroom(name: str, location: str, capacity: int, equipment: Optional[dict] = None) -> int:
     """강의실을 생성하고 ID를 반환"""
-    global _next_id
-    classroom_id = _next_id
-    _next_id += 1
-    
-    CLASSROOMS[classroom_id] = {
-        "name": name,
-        "location": location,
-        "capacity": capacity,
-        "equipment": equipment or {}
-    }
-    _save_classrooms()  # 파일에 저장
+    global _next_id, _CLASSROOMS_VERSION
+    with _STORE.mutation():
+        classroom_id = _next_id
+        _next_id += 1
+        
+        CLASSROOMS[classroom_id] = {
+            "name": name,
+            "location": location,
+            "capacity": capacity,
+            "equipment": equipment or {}
+        }
+        _CLASSROOMS_VERSION += 1
+        _STORE.append("put", {"id": classroom_id, "data": CLASSROOMS[classroom_id]})
     return classroom_id
 
 def get_classroom(classroom_id: int) -> Optional[dict]:
     """강의실 정보를 조회"""
     return CLASSROOMS.get(classroom_id)
 
-def get_all_classrooms() -> dict[int, dict]:
-    """모든 강의실 정보를 조회"""
-    return CLASSROOMS.copy()
+@lru_cache(maxsize=1)
+def _all_cached(version: int) -> Mapping[int, dict]:
+    """version 시점의 강의실 목록 (버전이 바뀔 때만 새로 복사)"""
+    return MappingProxyType(CLASSROOMS.copy())
+
+def get_all_classrooms() -> Mapping[int, dict]:
+    """모든 강의실 정보를 조회 (읽기 전용, 수정하려면 dict(...)로 복사해서 사용)"""
+    return _all_cached(_CLASSROOMS_VERSION)
 
 def update_classroom(classroom_id: int, name: Optional[str] = None, 
                      location: Optional[str] = None, capacity: Optional[int] = None,
                      equipment: Optional[dict] = None) -> bool:
     """강의실 정보를 수정"""
-    if classroom_id not in CLASSROOMS:
-        return False
-    
-    if name is not None:
-        CLASSROOMS[classroom_id]["name"] = name
-    if location is not None:
-        CLASSROOMS[classroom_id]["location"] = location
-    if capacity is not None:
-        CLASSROOMS[classroom_id]["capacity"] = capacity
-    if equipment is not None:
-        CLASSROOMS[classroom_id]["equipment"] = equipment
-    
-    _save_classrooms()  # 파일에 저장
-    return True
+    global _CLASSROOMS_VERSION
+    with _STORE.mutation():
+        if classroom_id not in CLASSROOMS:
+            return False
+        
+        if name is not None:
+            CLASSROOMS[classroom_id]["name"] = name
+        if location is not None:
+            CLASSROOMS[classroom_id]["location"] = location
+        if capacity is not None:
+            CLASSROOMS[classroom_id]["capacity"] = capacity
+        if equipment is not None:
+            CLASSROOMS[classroom_id]["equipment"] = equipment
+        _CLASSROOMS_VERSION += 1
+        
+        _STORE.append("put", {"id": classroom_id, "data": CLASSROOMS[classroom_id]})
+        return True
 
 def delete_classroom(classroom_id: int) -> bool:
     """강의실을 삭제"""
-    if classroom_id in CLASSROOMS:
-        del CLASSROOMS[classroom_id]
-        _save_classrooms()  # 파일에 저장
-        return True
-    return False
+    global _CLASSROOMS_VERSION
+    with _STORE.mutation():
+        if classroom_id in CLASSROOMS:
+            del CLASSROOMS[classroom_id]
+            _CLASSROOMS_VERSION += 1
+            _STORE.append("delete", {"id": classroom_id})
+            return True
+        return False
 
@@ -0,0 +1,231 @@
+import asyncio
+import os
+import threading
+from contextlib import contextmanager
+from typing import Callable, Iterator, Optional
+
+import aiofiles
+import aiofiles.os
+import orjson
+
+# 스냅샷 파일 저장용 헬퍼
+# 임시 파일에 끝까지 쓰고 디스크에 반영(fsync)한 뒤 이름을 바꾸므로,
+# 저장 도중 서버가 죽어도 기존 파일이 잘린 채로 남지 않음
+
+def atomic_write(path: str, data: bytes) -> None:
+    """data를 path에 원자적으로 저장 (실패 시 OSError 발생, 기존 파일은 그대로 유지)"""
+    tmp_path = path + ".tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except OSError:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+async def atomic_write_async(path: str, data: bytes) -> None:
+    """atomic_write()의 비동기 버전 (파일을 쓰는 동안 이벤트 루프를 막지 않음)"""
+    tmp_path = path + ".tmp"
+    try:
+        async with aiofiles.open(tmp_path, "wb") as f:
+            await f.write(data)
+            await f.flush()
+            await asyncio.to_thread(os.fsync, f.fileno())
+        await aiofiles.os.replace(tmp_path, path)
+    except OSError:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+# 변경 로그 + 스냅샷 저장소 파일 관리
+# 변경 내역은 log_file에 한 줄씩({"op": "put" | "delete", "id": ..., ...}) 추가되고,
+# compact() 시 스냅샷(snapshot_file)으로 합쳐짐
+# 시작 시에는 스냅샷을 읽은 뒤 replay()로 정리 중 옮겨 둔 로그(log_file + ".old")와 현재 로그를 차례로 반영
+# (로그는 한 줄씩 읽지만, 스냅샷은 각 모듈의 _load_*()가 파일 전체를 orjson으로 한 번에 파싱함
+#  스트리밍 파서보다 빠른 대신 시작 시 최대 메모리는 스냅샷 크기에 비례하고, 스냅샷은 데이터와 함께 커짐)
+
+COMPACT_EVERY = 100  # 로그에 쌓인 변경이 이 개수 이상이면 compact() 시 스냅샷 재작성
+
+class LogStore:
+    def __init__(self, snapshot_file: str, log_file: str,
+                 snapshot: Callable[[], bytes], apply: Callable[[dict], None],
+                 compact_every: int = COMPACT_EVERY) -> None:
+        """
+        Args:
+            snapshot: 현재 데이터를 스냅샷 파일 내용으로 직렬화 (lock을 잡은 상태에서 호출됨)
+            apply: 로그 한 줄(dict)을 데이터에 반영
+        """
+        self.snapshot_file = snapshot_file
+        self.log_file = log_file
+        self.old_log_file = log_file + ".old"  # 정리 중 스냅샷으로 옮겨지는 로그
+        self.snapshot = snapshot
+        self.apply = apply
+        self.compact_every = compact_every
+        self.lock = threading.RLock()  # 엔드포인트가 스레드풀에서 실행되므로 데이터 변경과 정리를 한 번에 하나씩 처리
+        self.pending_ops = 0
+        self._compacting = False
+        # 로그 기록은 lock 밖에서 함 (이벤트 루프에서 lock을 잡는 조회/정리가 디스크 쓰기를 기다리지 않도록)
+        # 변경 순서대로 _queue에 쌓고, _write_lock을 잡은 스레드가 한 번에 파일에 씀
+        self._queue: list[bytes] = []
+        self._write_lock = threading.Lock()
+        self._local = threading.local()  # 스레드별 batch() 진행 여부
+
+    def replay(self) -> int:
+        """옮겨 둔 로그와 현재 로그를 순서대로 반영하고 반영한 개수를 반환"""
+        self.pending_ops = self._replay_log(self.old_log_file) + self._replay_log(self.log_file)
+        return self.pending_ops
+
+    def _replay_log(self, path: str) -> int:
+        """로그 파일(path)의 변경 내역을 순서대로 반영하고 반영한 개수를 반환"""
+        if not os.path.exists(path):
+            return 0
+        count = 0
+        valid_end = 0  # 마지막으로 온전히(줄바꿈까지) 기록된 줄의 끝 위치
+        torn = False
+        try:
+            with open(path, "rb") as f:
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        torn = True  # 기록 도중 중단된 마지막 줄
+                        break
+                    valid_end += len(line)
+                    try:
+                        self.apply(orjson.loads(line))
+                    except (orjson.JSONDecodeError, KeyError, TypeError, ValueError, AttributeError):
+                        continue  # 손상된 줄이나 형식이 맞지 않는 기록은 건너뜀
+                    count += 1
+            # 중단된 줄을 잘라내지 않으면 다음 기록이 그 뒤에 이어 붙어 함께 버려짐
+            if torn:
+                os.truncate(path, valid_end)
+        except IOError:
+            pass
+        return count
+
+    def flush(self) -> None:
+        """쌓인 변경 내역을 로그 파일 끝에 추가 (lock을 잡지 않은 상태에서 호출)"""
+        with self._write_lock:  # 먼저 쌓인 줄이 먼저 기록되도록 한 번에 한 스레드만 씀
+            with self.lock:
+                lines, self._queue = self._queue, []
+            if not lines:
+                return  # 다른 스레드가 이미 기록함
+            try:
+                with open(self.log_file, "ab") as f:
+                    f.write(b"".join(line + b"\n" for line in lines))
+            except IOError:
+                pass  # 파일 저장 실패 시 무시 (로깅 가능)
+
+    def append(self, op_type: str, payload: dict) -> None:
+        """변경 내역 한 건을 기록 대기열에 추가 (mutation() 안에서 호출)"""
+        self._queue.append(orjson.dumps({"op": op_type, **payload}))
+        self.pending_ops += 1
+
+    @contextmanager
+    def mutation(self) -> Iterator[None]:
+        """lock을 잡고 데이터를 바꾼 뒤, lock을 푼 다음 로그를 기록 (batch() 안에서는 블록이 끝날 때 기록)"""
+        try:
+            with self.lock:
+                yield
+        finally:
+            if not getattr(self._local, "batching", False):
+                self.flush()
+
+    @contextmanager
+    def batch(self) -> Iterator[None]:
+        """블록 안의 변경 기록을 모아 두었다가 블록을 벗어날 때 한 번에 씀"""
+        if getattr(self._local, "batching", False):  # 이미 batch() 안이면 바깥 블록이 기록
+            yield
+            return
+        self._local.batching = True
+        try:
+            yield
+        finally:
+            self._local.batching = False
+            self.flush()
+
+    def _save(self, data: bytes) -> bool:
+        """직렬화된 스냅샷을 파일에 저장 (성공 여부 반환)"""
+        try:
+            atomic_write(self.snapshot_file, data)
+            return True
+        except IOError:
+            return False  # 저장 실패 시 옮겨 둔 로그를 남겨 두고 다음 정리 때 다시 시도
+
+    async def _save_async(self, data: bytes) -> bool:
+        """_save()의 비동기 버전 (파일을 쓰는 동안 이벤트 루프를 막지 않음)"""
+        try:
+            await atomic_write_async(self.snapshot_file, data)
+            return True
+        except IOError:
+            return False
+
+    def _begin_compaction(self, force: bool) -> Optional[tuple[bytes, int]]:
+        """정리할 차례면 스냅샷 내용을 만들고 현재 로그를 old_log_file로 옮긴 뒤 (스냅샷, 반영한 변경 수) 반환"""
+        with self.lock:
+            if self._compacting or self.pending_ops == 0 or (not force and self.pending_ops < self.compact_every):
+                return None
+            data = self.snapshot()
+            # 이전 정리에 실패해 옮겨 둔 로그가 남아 있으면 덮어쓰지 않음
+            # (현재 로그는 그대로 두어도 내용이 스냅샷에 포함되므로 다시 반영해도 결과가 같음)
+            if not os.path.exists(self.old_log_file) and os.path.exists(self.log_file):
+                try:
+                    os.replace(self.log_file, self.old_log_file)
+                except OSError:
+                    pass
+            ops, self.pending_ops = self.pending_ops, 0
+            self._compacting = True
+            return data, ops
+
+    def _end_compaction(self, saved: bool, ops: int) -> bool:
+        """스냅샷 저장에 성공했으면 옮겨 둔 로그를 삭제"""
+        with self.lock:
+            self._compacting = False
+            if not saved:
+                self.pending_ops += ops  # 다음 정리 때 다시 시도
+        if saved:
+            try:
+                os.remove(self.old_log_file)
+            except OSError:
+                pass
+        return saved
+
+    def _settled(self) -> bool:
+        """스냅샷에 반영되지 않은 변경이 없는지 확인"""
+        with self.lock:
+            return self.pending_ops == 0 and not self._compacting
+
+    def compact(self, force: bool = False) -> bool:
+        """쌓인 로그를 스냅샷 파일로 합침 (반영할 변경이 남지 않았으면 True, 서버 종료 시 사용)"""
+        job = self._begin_compaction(force)
+        if job is None:
+            return self._settled()  # 정리할 차례가 아니거나 다른 정리가 진행 중
+        data, ops = job
+        return self._end_compaction(self._save(data), ops)
+
+    async def compact_async(self, force: bool = False) -> bool:
+        """compact()의 비동기 버전 (스냅샷을 쓰는 동안 들어온 변경은 새 로그에 쌓임)"""
+        # 스냅샷 직렬화(저장소 전체)와 로그 이동도 스레드에서 처리해 이벤트 루프를 막지 않음
+        begin = asyncio.ensure_future(asyncio.to_thread(self._begin_compaction, force))
+        try:
+            job = await asyncio.shield(begin)
+        except asyncio.CancelledError:
+            # 스레드에서 이미 시작된 정리는 끝나기를 기다렸다가 상태를 풀어 둠
+            job = await begin
+            if job is not None:
+                self._end_compaction(False, job[1])
+            raise
+        if job is None:
+            return self._settled()
+        data, ops = job
+        saved = False
+        try:
+            saved = await self._save_async(data)
+        finally:  # 취소되더라도 정리 상태는 풀어 둠
+            self._end_compaction(saved, ops)
+        return saved
@@ -1,32 +1,100 @@
 # main.py
 
-from fastapi import FastAPI, Request, Form, HTTPException, Query
-from fastapi.responses import HTMLResponse, RedirectResponse
+import asyncio
+import logging
+import os
+from contextlib import asynccontextmanager, suppress
+from datetime import datetime
+from typing import AsyncIterator
+
+from fastapi import BackgroundTasks, Depends, FastAPI, Request, Form, HTTPException, Query
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import HTMLResponse, ORJSONResponse, RedirectResponse
 from starlette import status
-from starlette.middleware.sessions import SessionMiddleware
 from starlette.templating import Jinja2Templates
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
+
+from session_middleware import FastSessionMiddleware
 
 # user_db.py와 classroom_db.py에서 함수 가져오기
-from user_db import register_user, get_user, get_user_role, Role
+from user_db import (
+    register_user, get_user, get_user_role, Role,
+    compact as compact_users, compact_async as compact_users_async
+)
 from classroom_db import (
     create_classroom, get_classroom, get_all_classrooms,
-    update_classroom, delete_classroom
+    update_classroom, delete_classroom,
+    compact as compact_classrooms, compact_async as compact_classrooms_async
 )
 from reservation_db import (
     create_reservation, get_user_reservations, 
-    get_classroom_reservations, cancel_reservation
+    get_classroom_reservations, cancel_reservation,
+    compact as compact_reservations, compact_async as compact_reservations_async
 )
 
-app = FastAPI()
-app.add_middleware(SessionMiddleware, secret_key="your-secret-key-change-in-production")
+COMPACTION_INTERVAL_SECONDS = 30  # 변경 로그를 스냅샷으로 합칠지 확인하는 주기
+TEMPLATE_CACHE_DIR = ".jinja_cache"  # 컴파일된 템플릿 바이트코드 저장 위치
+
+logger = logging.getLogger("uvicorn.error")
 
-templates = Jinja2Templates(directory="templates")
+# uvicorn 밖에서 실행될 때도 uvloop을 쓰도록 설정 (설치되지 않은 환경에서는 기본 이벤트 루프 사용)
+try:
+    import uvloop
+except ImportError:
+    pass
+else:
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
 
 # =============================================================
-# 헬퍼 함수
+# 데이터 파일 정리 (로그 -> 스냅샷)
 # =============================================================
 
-def get_current_user(request: Request) -> dict | None:
+async def _compaction_loop() -> None:
+    """주기적으로 각 저장소의 변경 로그를 스냅샷으로 합침"""
+    while True:
+        await asyncio.sleep(COMPACTION_INTERVAL_SECONDS)
+        await compact_users_async()
+        await compact_classrooms_async()
+        await compact_reservations_async()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    """서버가 실행되는 동안 주기적으로 정리하고, 종료 시 남은 로그를 모두 스냅샷에 반영"""
+    task = asyncio.create_task(_compaction_loop())
+    yield
+    task.cancel()
+    # 진행 중이던 정리가 끝나야 아래 강제 정리가 "정리 중"으로 건너뛰어지지 않음
+    with suppress(asyncio.CancelledError):
+        await task
+    for name, compact in (("users", compact_users),
+                          ("classrooms", compact_classrooms),
+                          ("reservations", compact_reservations)):
+        if not compact(force=True):
+            # 로그 파일은 남아 있으므로 다음 시작 시 다시 반영됨
+            logger.warning("%s 스냅샷을 저장하지 못했습니다. 다음 시작 시 변경 로그에서 복구합니다.", name)
+
+app = FastAPI(default_response_class=ORJSONResponse, lifespan=lifespan)
+app.add_middleware(FastSessionMiddleware, secret_key="your-secret-key-change-in-production")
+# 목록/타임라인 HTML처럼 반복되는 마크업이 많은 응답을 압축 (1KB 미만은 그대로 전송)
+app.add_middleware(GZipMiddleware, minimum_size=1024, compresslevel=5)
+
+# 컴파일된 템플릿을 파일로 캐시해 재시작 후에도 다시 파싱하지 않음
+# auto_reload=False: 템플릿 파일 변경 여부를 매번 확인하지 않음 (템플릿 수정 후에는 서버 재시작 필요)
+os.makedirs(TEMPLATE_CACHE_DIR, exist_ok=True)
+templates = Jinja2Templates(env=Environment(
+    loader=FileSystemLoader("templates"),
+    bytecode_cache=FileSystemBytecodeCache(TEMPLATE_CACHE_DIR),
+    auto_reload=False,
+    autoescape=True
+))
+
+# =============================================================
+# 헬퍼 함수 (의존성)
+# Depends로 주입하면 FastAPI가 한 요청 안에서 결과를 재사용함
+# I/O가 없으므로 async def로 선언해 스레드풀을 거치지 않고 이벤트 루프에서 바로 실행
+# =============================================================
+
+async def current_user(request: Request) -> dict | None:
     """현재 로그인한 사용자 정보 반환"""
     user_id = request.session.get("user_id")
     if not user_id:
@@ -40,36 +108,43 @@ def get_current_user(request: Request) -> dict | None:
         }
     return None
 
-def require_auth(request: Request) -> dict:
+async def require_auth(user: dict | None = Depends(current_user)) -> dict:
     """인증이 필요한 엔드포인트에서 사용"""
-    user = get_current_user(request)
     if not user:
         raise HTTPException(status_code=401, detail="로그인이 필요합니다.")
     return user
 
-def require_admin(request: Request) -> dict:
+async def require_admin(user: dict = Depends(require_auth)) -> dict:
     """관리자 권한이 필요한 엔드포인트에서 사용"""
-    user = require_auth(request)
     if user.get("role") != "Admin":
         raise HTTPException(status_code=403, detail="관리자 권한이 필요합니다.")
     return user
 
+async def require_classroom(classroom_id: int) -> dict:
+    """경로의 classroom_id에 해당하는 강의실 반환 (없으면 404)"""
+    classroom = get_classroom(classroom_id)
+    if not classroom:
+        raise HTTPException(status_code=404, detail="강의실을 찾을 수 없습니다.")
+    return classroom
+
 # =============================================================
 # 1. 인증 관련 엔드포인트
+# 데이터를 변경하는 엔드포인트는 파일 기록이 이벤트 루프를 막지 않도록
+# 일반 함수(def)로 선언 -> FastAPI가 스레드풀에서 실행
 # =============================================================
 
 # GET: 회원가입 폼 페이지 제공
 @app.get("/register", response_class=HTMLResponse)
-async def get_register_form(request: Request):
-    user = get_current_user(request)
+async def get_register_form(request: Request, user: dict | None = Depends(current_user)):
     if user:
         return RedirectResponse(url="/", status_code=status.HTTP_302_FOUND)
     return templates.TemplateResponse("register.html", {"request": request, "error_message": None})
 
 # POST: 폼 데이터 처리 및 사용자 등록
 @app.post("/register")
-async def post_register(
+def post_register(
     request: Request,
+    background: BackgroundTasks,
     user_id: str = Form(...),
     password: str = Form(...),
     role: Role = Form(...)
@@ -79,6 +154,7 @@ async def post_register(
         return templates.TemplateResponse("register.html", {"request": request, "error_message": error_msg})
     
     if register_user(user_id, password, role):
+        background.add_task(compact_users_async)
         return RedirectResponse(url="/login", status_code=status.HTTP_303_SEE_OTHER)
     else:
         error_msg = f"'{user_id}'는 이미 사용 중인 ID입니다."
@@ -86,8 +162,7 @@ async def post_register(
 
 # GET: 로그인 폼 페이지 제공
 @app.get("/login", response_class=HTMLResponse)
-async def get_login_form(request: Request):
-    user = get_current_user(request)
+async def get_login_form(request: Request, user: dict | None = Depends(current_user)):
     if user:
         return RedirectResponse(url="/", status_code=status.HTTP_302_FOUND)
     return templates.TemplateResponse("login.html", {"request": request, "error_message": None})
@@ -122,8 +197,7 @@ async def logout(request: Request):
 # =============================================================
 
 @app.get("/", response_class=HTMLResponse)
-async def root(request: Request):
-    user = get_current_user(request)
+async def root(request: Request, user: dict | None = Depends(current_user)):
     if not user:
         return RedirectResponse(url="/login", status_code=status.HTTP_302_FOUND)
     
@@ -138,38 +212,35 @@ async def root(request: Request):
 
 # 강의실 목록 조회 (모든 로그인 사용자 가능)
 @app.get("/classrooms", response_class=HTMLResponse)
-async def list_classrooms(request: Request):
-    require_auth(request)  # 로그인만 필요 (학생도 조회 가능)
+async def list_classrooms(request: Request, user: dict = Depends(require_auth)):
     classrooms = get_all_classrooms()
     return templates.TemplateResponse("classrooms.html", {
         "request": request,
         "classrooms": classrooms,
-        "user": get_current_user(request)
+        "user": user
     })
 
 # 강의실 생성 폼
 @app.get("/classrooms/create", response_class=HTMLResponse)
-async def create_classroom_form(request: Request):
-    require_admin(request)
+async def create_classroom_form(request: Request, user: dict = Depends(require_admin)):
     return templates.TemplateResponse("classroom_form.html", {
         "request": request,
-        "user": get_current_user(request),
+        "user": user,
         "classroom": None,
         "mode": "create"
     })
 
 # 강의실 생성
-@app.post("/classrooms/create")
-async def create_classroom_post(
+@app.post("/classrooms/create", dependencies=[Depends(require_admin)])
+def create_classroom_post(
     request: Request,
+    background: BackgroundTasks,
     name: str = Form(...),
     location: str = Form(...),
     capacity: int = Form(...),
     projector: bool = Form(default=False),
     whiteboard: bool = Form(default=False)
 ):
-    require_admin(request)
-    
     equipment = {}
     if projector:
         equipment["projector"] = True
@@ -177,37 +248,37 @@ async def create_classroom_post(
         equipment["whiteboard"] = True
     
     classroom_id = create_classroom(name, location, capacity, equipment)
+    background.add_task(compact_classrooms_async)
     return RedirectResponse(url="/classrooms", status_code=status.HTTP_303_SEE_OTHER)
 
 # 강의실 수정 폼
 @app.get("/classrooms/{classroom_id}/edit", response_class=HTMLResponse)
-async def edit_classroom_form(request: Request, classroom_id: int):
-    require_admin(request)
-    classroom = get_classroom(classroom_id)
-    if not classroom:
-        raise HTTPException(status_code=404, detail="강의실을 찾을 수 없습니다.")
-    
+async def edit_classroom_form(
+    request: Request,
+    classroom_id: int,
+    user: dict = Depends(require_admin),
+    classroom: dict = Depends(require_classroom)
+):
     return templates.TemplateResponse("classroom_form.html", {
         "request": request,
-        "user": get_current_user(request),
+        "user": user,
         "classroom": classroom,
         "classroom_id": classroom_id,
         "mode": "edit"
     })
 
 # 강의실 수정
-@app.post("/classrooms/{classroom_id}/edit")
-async def edit_classroom_post(
+@app.post("/classrooms/{classroom_id}/edit", dependencies=[Depends(require_admin)])
+def edit_classroom_post(
     request: Request,
     classroom_id: int,
+    background: BackgroundTasks,
     name: str = Form(...),
     location: str = Form(...),
     capacity: int = Form(...),
     projector: bool = Form(default=False),
     whiteboard: bool = Form(default=False)
 ):
-    require_admin(request)
-    
     equipment = {}
     if projector:
         equipment["projector"] = True
@@ -217,16 +288,20 @@ async def edit_classroom_post(
     if not update_classroom(classroom_id, name, location, capacity, equipment):
         raise HTTPException(status_code=404, detail="강의실을 찾을 수 없습니다.")
     
+    background.add_task(compact_classrooms_async)
     return RedirectResponse(url="/classrooms", status_code=status.HTTP_303_SEE_OTHER)
 
 # 강의실 삭제
-@app.post("/classrooms/{classroom_id}/delete")
-async def delete_classroom_post(request: Request, classroom_id: int):
-    require_admin(request)
-    
+@app.post("/classrooms/{classroom_id}/delete", dependencies=[Depends(require_admin)])
+def delete_classroom_post(
+    request: Request,
+    classroom_id: int,
+    background: BackgroundTasks
+):
     if not delete_classroom(classroom_id):
         raise HTTPException(status_code=404, detail="강의실을 찾을 수 없습니다.")
     
+    background.add_task(compact_classrooms_async)
     return RedirectResponse(url="/classrooms", status_code=status.HTTP_303_SEE_OTHER)
 
 # =============================================================
@@ -235,8 +310,11 @@ async def delete_classroom_post(request: Request, classroom_id: int):
 
 # 예약 생성 폼
 @app.get("/reservations/create", response_class=HTMLResponse)
-async def create_reservation_form(request: Request, classroom_id: int = Query(None)):
-    user = require_auth(request)  # 로그인 사용자만 예약 가능
+async def create_reservation_form(
+    request: Request,
+    classroom_id: int = Query(None),
+    user: dict = Depends(require_auth)  # 로그인 사용자만 예약 가능
+):
     classrooms = get_all_classrooms()
     
     return templates.TemplateResponse("reservation_form.html", {
@@ -249,14 +327,15 @@ async def create_reservation_form(request: Request, classroom_id: int = Query(No
 
 # 예약 생성
 @app.post("/reservations/create")
-async def create_reservation_post(
+def create_reservation_post(
     request: Request,
+    background: BackgroundTasks,
+    user: dict = Depends(require_auth),
     classroom_id: int = Form(...),
     date: str = Form(...),
     start_time: str = Form(...),
     end_time: str = Form(...)
 ):
-    user = require_auth(request)
     classrooms = get_all_classrooms()
     
     # 강의실 존재 확인
@@ -278,6 +357,7 @@ async def create_reservation_post(
     )
     
     if success:
+        background.add_task(compact_reservations_async)
         return RedirectResponse(url="/classrooms", status_code=status.HTTP_303_SEE_OTHER)
     else:
         return templates.TemplateResponse("reservation_form.html", {
@@ -289,83 +369,57 @@ async def create_reservation_post(
 
 # 내 예약 조회
 @app.get("/reservations", response_class=HTMLResponse)
-async def list_my_reservations(request: Request):
-    user = require_auth(request)
-    reservations = get_user_reservations(user["user_id"])
-    classrooms = get_all_classrooms()
-    
-    # 예약 데이터에 강의실 정보 추가
-    for reservation in reservations:
-        classroom_id = reservation["classroom_id"]
-        classroom = get_classroom(classroom_id)
-        reservation["classroom_name"] = classroom["name"] if classroom else f"강의실 {classroom_id}"
-        reservation["classroom_location"] = classroom["location"] if classroom else ""
-    
-    # 날짜와 시간 순으로 정렬 (최신순)
-    reservations.sort(key=lambda r: (r["date"], r["start_time"]), reverse=True)
-    
+async def list_my_reservations(request: Request, user: dict = Depends(require_auth)):
+    # 강의실 이름/위치는 템플릿에서 classrooms로 조회
     return templates.TemplateResponse("my_reservations.html", {
         "request": request,
         "user": user,
-        "reservations": reservations
+        "reservations": get_user_reservations(user["user_id"]),
+        "classrooms": get_all_classrooms()
     })
 
 # 강의실별 예약 현황 (타임라인)
 @app.get("/classrooms/{classroom_id}/reservations", response_class=HTMLResponse)
-async def classroom_reservations_timeline(request: Request, classroom_id: int, date: str = Query(None)):
-    user = require_auth(request)
-    classroom = get_classroom(classroom_id)
-    
-    if not classroom:
-        raise HTTPException(status_code=404, detail="강의실을 찾을 수 없습니다.")
-    
+async def classroom_reservations_timeline(
+    request: Request,
+    classroom_id: int,
+    date: str = Query(None),
+    user: dict = Depends(require_auth),
+    classroom: dict = Depends(require_classroom)
+):
     # 날짜가 지정되지 않았으면 오늘 날짜 사용
     if not date:
-        from datetime import datetime
         date = datetime.now().strftime("%Y-%m-%d")
     
-    reservations = get_classroom_reservations(classroom_id, date)
-    
-    # 예약 데이터에 사용자 정보 추가 (선택적)
-    from user_db import get_user
-    for reservation in reservations:
-        user_info = get_user(reservation["user_id"])
-        reservation["user_name"] = reservation["user_id"]  # 사용자 ID를 이름으로 사용
-    
+    # 예약자는 사용자 ID로 표시 (템플릿에서 reservation.user_id 사용)
     return templates.TemplateResponse("classroom_reservations.html", {
         "request": request,
         "user": user,
         "classroom": classroom,
         "classroom_id": classroom_id,
-        "reservations": reservations,
+        "reservations": get_classroom_reservations(classroom_id, date),
         "selected_date": date
     })
 
 # 예약 취소
 @app.post("/reservations/{reservation_id}/cancel")
-async def cancel_reservation_post(request: Request, reservation_id: int):
-    user = require_auth(request)
-    
+def cancel_reservation_post(
+    request: Request,
+    reservation_id: int,
+    background: BackgroundTasks,
+    user: dict = Depends(require_auth)
+):
     success, message = cancel_reservation(reservation_id, user["user_id"])
     
     if success:
+        background.add_task(compact_reservations_async)
         return RedirectResponse(url="/reservations", status_code=status.HTTP_303_SEE_OTHER)
     else:
         # 에러 메시지와 함께 내 예약 페이지로 리다이렉트 (간단한 구현)
-        reservations = get_user_reservations(user["user_id"])
-        classrooms = get_all_classrooms()
-        
-        for reservation in reservations:
-            classroom_id = reservation["classroom_id"]
-            classroom = get_classroom(classroom_id)
-            reservation["classroom_name"] = classroom["name"] if classroom else f"강의실 {classroom_id}"
-            reservation["classroom_location"] = classroom["location"] if classroom else ""
-        
-        reservations.sort(key=lambda r: (r["date"], r["start_time"]), reverse=True)
-        
         return templates.TemplateResponse("my_reservations.html", {
             "request": request,
             "user": user,
-            "reservations": reservations,
+            "reservations": get_user_reservations(user["user_id"]),
+            "classrooms": get_all_classrooms(),
             "error_message": message
         })
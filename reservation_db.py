@@ -1,44 +1,111 @@
-import json
+import bisect
+import orjson
 import os
+from contextlib import contextmanager
+from dataclasses import dataclass
 from datetime import datetime, date, time
-from typing import Optional, List
+from file_utils import LogStore
+from functools import lru_cache
+from typing import Iterator, Optional, List
+
+@dataclass(slots=True)
+class Reservation:
+    """예약 한 건 (__slots__로 dict보다 적은 메모리 사용)"""
+    user_id: str
+    classroom_id: int
+    date: str
+    start_time: str
+    end_time: str
+    start_min: int  # 자정 기준 분 단위 시간 (메모리에만 보관, 파일에는 "HH:MM" 문자열만 저장)
+    end_min: int
 
 # 예약 데이터 저장소
-# 구조: {reservation_id: {"user_id": str, "classroom_id": int, "date": str, "start_time": str, "end_time": str}}
+# 구조: {reservation_id: Reservation}
+# 변경 내역은 RESERVATIONS_LOG_FILE에 한 줄씩 추가되고, compact() 시 스냅샷(RESERVATIONS_FILE)으로 합쳐짐
 RESERVATIONS_FILE = "reservations.json"
-RESERVATIONS: dict[int, dict] = {}
+RESERVATIONS_LOG_FILE = "reservations.jsonl"
+RESERVATIONS: dict[int, Reservation] = {}
 _next_id = 1
 
-def _load_reservations() -> tuple[dict[int, dict], int]:
-    """파일에서 예약 데이터 로드"""
+# 조회용 인덱스 (RESERVATIONS와 항상 함께 갱신)
+# _BY_ROOM_DATE: {(classroom_id, date): [reservation_id, ...]}
+# _BY_USER: {user_id: [(date, start_time, reservation_id), ...]} - 날짜/시간 오름차순으로 정렬 유지
+_BY_ROOM_DATE: dict[tuple[int, str], list[int]] = {}
+_BY_USER: dict[str, list[tuple[str, str, int]]] = {}
+
+def _to_record(reservation: Reservation) -> dict:
+    """파일에 저장할 필드만 담은 예약 데이터 반환"""
+    return {
+        "user_id": reservation.user_id,
+        "classroom_id": reservation.classroom_id,
+        "date": reservation.date,
+        "start_time": reservation.start_time,
+        "end_time": reservation.end_time
+    }
+
+def _to_row(reservation_id: int, reservation: Reservation) -> dict:
+    """조회 결과로 돌려줄 예약 데이터 반환 (id 포함, dict 하나만 생성)"""
+    return {
+        "id": reservation_id,
+        "user_id": reservation.user_id,
+        "classroom_id": reservation.classroom_id,
+        "date": reservation.date,
+        "start_time": reservation.start_time,
+        "end_time": reservation.end_time
+    }
+
+def _load_reservations() -> int:
+    """파일에서 예약 데이터를 RESERVATIONS에 바로 로드하고 next_id를 반환"""
     if os.path.exists(RESERVATIONS_FILE):
         try:
-            with open(RESERVATIONS_FILE, "r", encoding="utf-8") as f:
-                data = json.load(f)
-                reservations = {int(k): v for k, v in data.get("reservations", {}).items()}
-                next_id = data.get("next_id", 1)
-                return reservations, next_id
-        except (json.JSONDecodeError, IOError, ValueError, KeyError):
-            return {}, 1
-    return {}, 1
-
-def _save_reservations() -> None:
-    """예약 데이터를 파일에 저장"""
-    try:
-        data = {
-            "reservations": {str(k): v for k, v in RESERVATIONS.items()},
-            "next_id": _next_id
-        }
-        with open(RESERVATIONS_FILE, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
-    except IOError:
-        pass
-
-# 서버 시작 시 데이터 로드
-loaded_reservations, loaded_next_id = _load_reservations()
-RESERVATIONS.update(loaded_reservations)
-_next_id = loaded_next_id
+            with open(RESERVATIONS_FILE, "rb") as f:
+                data = orjson.loads(f.read())
+            # 중간 dict 없이 읽은 레코드를 바로 Reservation으로 바꿔 저장소에 넣음
+            for k, v in data.get("reservations", {}).items():
+                RESERVATIONS[int(k)] = _from_record(v)
+            return data.get("next_id", 1)
+        except (orjson.JSONDecodeError, IOError, ValueError, KeyError):
+            RESERVATIONS.clear()
+            return 1
+    return 1
+
+def _snapshot_bytes() -> bytes:
+    """현재 예약 데이터를 스냅샷 파일 내용으로 직렬화"""
+    data = {
+        "reservations": {k: _to_record(v) for k, v in RESERVATIONS.items()},
+        "next_id": _next_id
+    }
+    return orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
 
+def _apply(record: dict) -> None:
+    """로그 한 줄의 변경 내역을 RESERVATIONS에 반영"""
+    global _next_id
+    reservation_id = record.get("id")
+    if record.get("op") == "put":
+        RESERVATIONS[reservation_id] = _from_record(record["data"])
+        _next_id = max(_next_id, reservation_id + 1)
+    elif record.get("op") == "delete":
+        RESERVATIONS.pop(reservation_id, None)
+
+_STORE = LogStore(RESERVATIONS_FILE, RESERVATIONS_LOG_FILE, _snapshot_bytes, _apply)
+compact = _STORE.compact
+compact_async = _STORE.compact_async
+
+@contextmanager
+def bulk_write() -> Iterator[None]:
+    """
+    블록 안의 예약 변경을 모아 두었다가 블록을 벗어날 때 한 번에 기록
+
+    예:
+        with bulk_write():
+            for row in rows:
+                create_reservation(*row)
+    """
+    with _STORE.batch():
+        yield
+
+# 시간/날짜 문자열은 종류가 적고 반복해서 들어오므로 파싱 결과를 캐시 (잘못된 값은 캐시되지 않음)
+@lru_cache(maxsize=1024)
 def _parse_time(time_str: str) -> time:
     """시간 문자열을 time 객체로 변환 (예: "14:00" -> time(14, 0))"""
     try:
@@ -47,6 +114,7 @@ def _parse_time(time_str: str) -> time:
     except (ValueError, AttributeError):
         raise ValueError(f"잘못된 시간 형식: {time_str}")
 
+@lru_cache(maxsize=1024)
 def _parse_date(date_str: str) -> date:
     """날짜 문자열을 date 객체로 변환 (예: "2024-01-15" -> date(2024, 1, 15))"""
     try:
@@ -60,28 +128,63 @@ def _is_past_datetime(reservation_date: date, start_time: time) -> bool:
     reservation_datetime = datetime.combine(reservation_date, start_time)
     return reservation_datetime < now
 
-def _is_valid_time_slot(start_time: time, end_time: time) -> bool:
-    """정시~정시 1시간 단위인지 확인"""
-    # 시작 시간과 종료 시간이 정시(분이 0)인지 확인
-    if start_time.minute != 0 or end_time.minute != 0:
-        return False
-    # 종료 시간이 시작 시간 + 1시간인지 확인
-    expected_end_hour = (start_time.hour + 1) % 24
-    return end_time.hour == expected_end_hour
-
-def _is_time_overlap(start1: time, end1: time, start2: time, end2: time) -> bool:
-    """두 시간 구간이 겹치는지 확인"""
-    # 시간 객체를 비교 가능한 형태로 변환 (분 단위로)
-    def time_to_minutes(t: time) -> int:
-        return t.hour * 60 + t.minute
-    
-    start1_min = time_to_minutes(start1)
-    end1_min = time_to_minutes(end1)
-    start2_min = time_to_minutes(start2)
-    end2_min = time_to_minutes(end2)
+def _to_minutes(start_time: time, end_time: time) -> tuple[int, int]:
+    """시작/종료 시간을 자정 기준 분 단위로 변환 (자정을 넘기는 종료 시간은 다음 날로 계산)"""
+    start_min = start_time.hour * 60 + start_time.minute
+    end_min = end_time.hour * 60 + end_time.minute
+    if end_min <= start_min:  # 예: 23:00~00:00
+        end_min += 24 * 60
+    return start_min, end_min
+
+def _is_valid_time_slot(start_min: int, end_min: int) -> bool:
+    """정시~정시 1시간 단위인지 확인 (분 단위 시간, 종료가 시작 + 60분이면 종료도 정시)"""
+    return start_min % 60 == 0 and end_min - start_min == 60
+
+def _from_record(record: dict) -> Reservation:
+    """파일에서 읽은 예약 데이터로 Reservation 생성"""
+    start_min, end_min = _to_minutes(_parse_time(record["start_time"]), _parse_time(record["end_time"]))
+    return Reservation(
+        user_id=record["user_id"],
+        classroom_id=record["classroom_id"],
+        date=record["date"],
+        start_time=record["start_time"],
+        end_time=record["end_time"],
+        start_min=start_min,
+        end_min=end_min
+    )
+
+def _index_add(reservation_id: int, reservation: Reservation) -> None:
+    """예약을 인덱스에 추가"""
+    key = (reservation.classroom_id, reservation.date)
+    _BY_ROOM_DATE.setdefault(key, []).append(reservation_id)
+    bisect.insort(
+        _BY_USER.setdefault(reservation.user_id, []),
+        (reservation.date, reservation.start_time, reservation_id),
+    )
+
+def _index_remove(reservation_id: int, reservation: Reservation) -> None:
+    """예약을 인덱스에서 제거"""
+    key = (reservation.classroom_id, reservation.date)
+    ids = _BY_ROOM_DATE.get(key)
+    if ids is not None:
+        ids.remove(reservation_id)
+        if not ids:
+            del _BY_ROOM_DATE[key]
     
-    # 겹치는 경우: start1 < end2 and start2 < end1
-    return start1_min < end2_min and start2_min < end1_min
+    entries = _BY_USER.get(reservation.user_id)
+    if entries is not None:
+        entry = (reservation.date, reservation.start_time, reservation_id)
+        i = bisect.bisect_left(entries, entry)
+        if i < len(entries) and entries[i] == entry:
+            del entries[i]
+        if not entries:
+            del _BY_USER[reservation.user_id]
+
+# 서버 시작 시 데이터 로드: 스냅샷을 읽은 뒤 옮겨 둔 로그와 현재 로그를 차례로 반영하고 인덱스 구성
+_next_id = _load_reservations()
+_STORE.replay()
+for _reservation_id, _reservation in RESERVATIONS.items():
+    _index_add(_reservation_id, _reservation)
 
 def create_reservation(user_id: str, classroom_id: int, reservation_date: str, start_time_str: str, end_time_str: str) -> tuple[bool, str]:
     """
@@ -104,58 +207,78 @@ def create_reservation(user_id: str, classroom_id: int, reservation_date: str, s
     if _is_past_datetime(reservation_date_obj, start_time_obj):
         return False, "과거 시간은 예약할 수 없습니다."
     
-    # 3. 정책 검증: 1시간 단위 정시~정시만 가능
-    if not _is_valid_time_slot(start_time_obj, end_time_obj):
+    # 3. 정책 검증: 1시간 단위 정시~정시만 가능 (이후 검사는 모두 분 단위 정수로 처리)
+    start_min, end_min = _to_minutes(start_time_obj, end_time_obj)
+    if not _is_valid_time_slot(start_min, end_min):
         return False, "예약은 정시~정시 1시간 단위로만 가능합니다. (예: 14:00~15:00)"
     
-    # 4. 해당 강의실의 같은 날짜 예약들 확인
-    for reservation in RESERVATIONS.values():
-        if (reservation["classroom_id"] == classroom_id and 
-            reservation["date"] == reservation_date):
-            existing_start = _parse_time(reservation["start_time"])
-            existing_end = _parse_time(reservation["end_time"])
+    with _STORE.mutation():
+        # 4. 해당 강의실의 같은 날짜 예약들 확인 (확인과 생성 사이에 다른 예약이 끼어들지 않도록 잠금)
+        for existing_id in _BY_ROOM_DATE.get((classroom_id, reservation_date), ()):
+            existing = RESERVATIONS[existing_id]
             
-            # 시간 겹침 확인
-            if _is_time_overlap(start_time_obj, end_time_obj, existing_start, existing_end):
+            # 시간 겹침 확인: start1 < end2 and start2 < end1
+            if existing.start_min < end_min and start_min < existing.end_min:
                 return False, "해당 시간에 이미 예약이 존재합니다."
+        
+        # 5. 예약 생성
+        reservation_id = _next_id
+        _next_id += 1
+        
+        RESERVATIONS[reservation_id] = Reservation(
+            user_id=user_id,
+            classroom_id=classroom_id,
+            date=reservation_date,
+            start_time=start_time_str,
+            end_time=end_time_str,
+            start_min=start_min,
+            end_min=end_min
+        )
+        _index_add(reservation_id, RESERVATIONS[reservation_id])
+        _STORE.append("put", {"id": reservation_id, "data": _to_record(RESERVATIONS[reservation_id])})
     
-    # 5. 예약 생성
-    reservation_id = _next_id
-    _next_id += 1
+    return True, "예약이 성공적으로 생성되었습니다."
+
+def create_reservations_batch(items: List[tuple[str, int, str, str, str]]) -> List[tuple[bool, str]]:
+    """
+    여러 예약을 한 번에 생성하고 각 항목의 결과를 순서대로 반환
     
-    RESERVATIONS[reservation_id] = {
-        "user_id": user_id,
-        "classroom_id": classroom_id,
-        "date": reservation_date,
-        "start_time": start_time_str,
-        "end_time": end_time_str
-    }
-    _save_reservations()
+    Args:
+        items: (user_id, classroom_id, reservation_date, start_time_str, end_time_str) 목록
     
-    return True, "예약이 성공적으로 생성되었습니다."
+    Returns:
+        항목별 (success: bool, message: str) 목록
+    """
+    with bulk_write():
+        return [create_reservation(*item) for item in items]
 
-def get_reservation(reservation_id: int) -> Optional[dict]:
+def get_reservation(reservation_id: int) -> Optional[Reservation]:
     """예약 정보를 조회"""
     return RESERVATIONS.get(reservation_id)
 
 def get_user_reservations(user_id: str) -> List[dict]:
-    """특정 사용자의 모든 예약을 조회"""
-    return [
-        {**reservation, "id": res_id}
-        for res_id, reservation in RESERVATIONS.items()
-        if reservation["user_id"] == user_id
-    ]
+    """특정 사용자의 모든 예약을 조회 (날짜와 시간 기준 최신순)"""
+    with _STORE.lock:
+        return [
+            _to_row(res_id, RESERVATIONS[res_id])
+            for _, _, res_id in reversed(_BY_USER.get(user_id, ()))
+        ]
 
 def get_classroom_reservations(classroom_id: int, date: Optional[str] = None) -> List[dict]:
     """특정 강의실의 예약을 조회 (날짜 필터링 옵션)"""
-    reservations = [
-        {**reservation, "id": res_id}
-        for res_id, reservation in RESERVATIONS.items()
-        if reservation["classroom_id"] == classroom_id
-    ]
-    
-    if date:
-        reservations = [r for r in reservations if r["date"] == date]
+    with _STORE.lock:
+        if date:
+            # 날짜가 주어지면 인덱스에서 해당 날짜 예약만 바로 조회
+            reservations = [
+                _to_row(res_id, RESERVATIONS[res_id])
+                for res_id in _BY_ROOM_DATE.get((classroom_id, date), ())
+            ]
+        else:
+            reservations = [
+                _to_row(res_id, reservation)
+                for res_id, reservation in RESERVATIONS.items()
+                if reservation.classroom_id == classroom_id
+            ]
     
     # 날짜와 시간 순으로 정렬
     reservations.sort(key=lambda r: (r["date"], r["start_time"]))
@@ -163,21 +286,25 @@ def get_classroom_reservations(classroom_id: int, date: Optional[str] = None) ->
 
 def cancel_reservation(reservation_id: int, user_id: str) -> tuple[bool, str]:
     """예약을 취소 (본인 예약만 취소 가능)"""
-    if reservation_id not in RESERVATIONS:
-        return False, "존재하지 않는 예약입니다."
-    
-    reservation = RESERVATIONS[reservation_id]
-    if reservation["user_id"] != user_id:
-        return False, "본인의 예약만 취소할 수 있습니다."
-    
-    del RESERVATIONS[reservation_id]
-    _save_reservations()
-    return True, "예약이 취소되었습니다."
+    with _STORE.mutation():
+        if reservation_id not in RESERVATIONS:
+            return False, "존재하지 않는 예약입니다."
+        
+        reservation = RESERVATIONS[reservation_id]
+        if reservation.user_id != user_id:
+            return False, "본인의 예약만 취소할 수 있습니다."
+        
+        _index_remove(reservation_id, reservation)
+        del RESERVATIONS[reservation_id]
+        _STORE.append("delete", {"id": reservation_id})
+        return True, "예약이 취소되었습니다."
 
 def delete_reservation(reservation_id: int) -> bool:
     """예약을 삭제 (관리자용)"""
-    if reservation_id in RESERVATIONS:
-        del RESERVATIONS[reservation_id]
-        _save_reservations()
-        return True
-    return False
+    with _STORE.mutation():
+        if reservation_id in RESERVATIONS:
+            _index_remove(reservation_id, RESERVATIONS[reservation_id])
+            del RESERVATIONS[reservation_id]
+            _STORE.append("delete", {"id": reservation_id})
+            return True
+        return False
@@ -0,0 +1,117 @@
+import base64
+import hashlib
+import hmac
+import time
+
+import orjson
+
+# 서명된 쿠키 기반 세션 미들웨어 (순수 ASGI)
+# 쿠키 형식: <base64(JSON)>.<발급 시각>.<base64(HMAC-SHA256)>
+# 요청마다 쿠키를 한 번만 검증/디코딩해서 scope["session"]에 넣고,
+# 세션이 바뀐 응답에서만 쿠키를 다시 만듦 (request.session으로 그대로 사용 가능)
+
+class _Session(dict):
+    """값이 바뀌었는지 기록하는 세션 dict"""
+    modified = False
+
+    def __setitem__(self, key, value):
+        self.modified = True
+        super().__setitem__(key, value)
+
+    def __delitem__(self, key):
+        self.modified = True
+        super().__delitem__(key)
+
+    def clear(self):
+        self.modified = True
+        super().clear()
+
+    def pop(self, *args):
+        self.modified = True
+        return super().pop(*args)
+
+    def popitem(self):
+        self.modified = True
+        return super().popitem()
+
+    def setdefault(self, key, default=None):
+        self.modified = True
+        return super().setdefault(key, default)
+
+    def update(self, *args, **kwargs):
+        self.modified = True
+        super().update(*args, **kwargs)
+
+class FastSessionMiddleware:
+    def __init__(self, app, secret_key: str, session_cookie: str = "session",
+                 max_age: int = 14 * 24 * 60 * 60, path: str = "/",
+                 same_site: str = "lax", https_only: bool = False) -> None:
+        self.app = app
+        self.secret_key = secret_key.encode("utf-8")
+        self.session_cookie = session_cookie
+        self.max_age = max_age
+        self.cookie_flags = f"path={path}; httponly; samesite={same_site}"
+        if https_only:
+            self.cookie_flags += "; secure"
+
+    def _sign(self, value: bytes) -> bytes:
+        digest = hmac.new(self.secret_key, value, hashlib.sha256).digest()
+        return base64.urlsafe_b64encode(digest).rstrip(b"=")
+
+    def _read_cookie(self, scope) -> bytes | None:
+        """요청 헤더에서 세션 쿠키 값만 찾아 반환"""
+        prefix = self.session_cookie.encode("latin-1") + b"="
+        for name, value in scope.get("headers", ()):
+            if name != b"cookie":
+                continue
+            for chunk in value.split(b";"):
+                chunk = chunk.strip()
+                if chunk.startswith(prefix):
+                    return chunk[len(prefix):]
+        return None
+
+    def _decode(self, raw: bytes) -> dict:
+        """쿠키 값을 검증하고 세션 데이터를 반환 (위조/만료/손상 시 빈 dict)"""
+        try:
+            payload, issued_at, signature = raw.split(b".")
+            if not hmac.compare_digest(signature, self._sign(payload + b"." + issued_at)):
+                return {}
+            if int(issued_at) + self.max_age < time.time():
+                return {}
+            data = orjson.loads(base64.urlsafe_b64decode(payload + b"=" * (-len(payload) % 4)))
+        except (ValueError, orjson.JSONDecodeError):
+            return {}
+        return data if isinstance(data, dict) else {}
+
+    def _encode(self, session: dict) -> str:
+        payload = base64.urlsafe_b64encode(orjson.dumps(session)).rstrip(b"=")
+        value = payload + b"." + str(int(time.time())).encode("ascii")
+        return (value + b"." + self._sign(value)).decode("ascii")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+
+        raw = self._read_cookie(scope)
+        session = _Session(self._decode(raw) if raw else {})
+        scope["session"] = session
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and session.modified:
+                if session:
+                    cookie = (f"{self.session_cookie}={self._encode(session)}; "
+                              f"{self.cookie_flags}; max-age={self.max_age}")
+                elif raw:
+                    # 세션이 비워졌으면 쿠키 삭제
+                    cookie = (f"{self.session_cookie}=null; {self.cookie_flags}; "
+                              "expires=Thu, 01 Jan 1970 00:00:00 GMT")
+                else:
+                    cookie = None
+                if cookie is not None:
+                    headers = list(message.get("headers", []))
+                    headers.append((b"set-cookie", cookie.encode("latin-1")))
+                    message["headers"] = headers
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
@@ -1,42 +1,51 @@
-import json
+import orjson
 import os
+from file_utils import LogStore
 from typing import Literal
 
 Role = Literal["Student", "Admin"]
 
+# 변경 내역은 USERS_LOG_FILE에 한 줄씩 추가되고, compact() 시 스냅샷(USERS_FILE)으로 합쳐짐
 USERS_FILE = "users.json"
+USERS_LOG_FILE = "users.jsonl"
 USERS: dict[str, dict[str, str | Role]] = {}
 
-def _load_users() -> dict[str, dict[str, str | Role]]:
-    """파일에서 사용자 데이터 로드"""
+def _load_users() -> None:
+    """파일에서 사용자 데이터를 USERS에 바로 로드"""
     if os.path.exists(USERS_FILE):
         try:
-            with open(USERS_FILE, "r", encoding="utf-8") as f:
-                return json.load(f)
-        except (json.JSONDecodeError, IOError):
-            return {}
-    return {}
-
-def _save_users() -> None:
-    """사용자 데이터를 파일에 저장"""
-    try:
-        with open(USERS_FILE, "w", encoding="utf-8") as f:
-            json.dump(USERS, f, ensure_ascii=False, indent=2)
-    except IOError:
-        pass  # 파일 저장 실패 시 무시 (로깅 가능)
-
-# 서버 시작 시 데이터 로드
-USERS.update(_load_users())
+            with open(USERS_FILE, "rb") as f:
+                USERS.update(orjson.loads(f.read()))
+        except (orjson.JSONDecodeError, IOError, ValueError):
+            pass
+
+def _snapshot_bytes() -> bytes:
+    """현재 사용자 데이터를 스냅샷 파일 내용으로 직렬화"""
+    return orjson.dumps(USERS, option=orjson.OPT_INDENT_2)
+
+def _apply(record: dict) -> None:
+    """로그 한 줄의 변경 내역을 USERS에 반영"""
+    if record.get("op") == "put":
+        USERS[record["id"]] = record["data"]
+
+_STORE = LogStore(USERS_FILE, USERS_LOG_FILE, _snapshot_bytes, _apply)
+compact = _STORE.compact
+compact_async = _STORE.compact_async
+
+# 서버 시작 시 데이터 로드: 스냅샷을 읽은 뒤 옮겨 둔 로그와 현재 로그를 차례로 반영
+_load_users()
+_STORE.replay()
 
 def register_user(user_id: str, password: str, role: Role) -> bool:
     """사용자를 등록하고 성공 여부를 반환"""
-    if user_id in USERS:
-        return False  # 이미 존재하는 ID
-    USERS[user_id] = {
-        "password": password,
-        "role": role
-    }
-    _save_users()  # 파일에 저장
+    with _STORE.mutation():
+        if user_id in USERS:
+            return False  # 이미 존재하는 ID
+        USERS[user_id] = {
+            "password": password,
+            "role": role
+        }
+        _STORE.append("put", {"id": user_id, "data": USERS[user_id]})
     return True
 
 def get_user(user_id: str) -> dict[str, str | Role] | None: